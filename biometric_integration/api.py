@@ -20,6 +20,11 @@ NGINX_TO_ORIGINAL_HEADERS = {
     "x-cmd-return-code": "cmd_return_code",
     "x-blk-no": "blk_no",
 }
+# The same headers as WSGI environ keys, so lookups skip werkzeug's EnvironHeaders normalisation.
+_NGINX_ENVIRON_HEADERS = tuple(
+    ("HTTP_" + nginx_header.upper().replace("-", "_"), original_header)
+    for nginx_header, original_header in NGINX_TO_ORIGINAL_HEADERS.items()
+)
 
 @frappe.whitelist(allow_guest=True)
 def handle_request():
@@ -28,15 +33,20 @@ def handle_request():
     It routes requests to the appropriate brand-specific processor based on the URL path.
     """
     original_user = frappe.session.user
+    # Devices call in as Guest; set_user recomputes roles, so only switch (and later restore) when needed.
+    switch_user = original_user != "Administrator"
     request = frappe.local.request
 
-    original_uri = request.headers.get('X-Original-Request-URI', '/')
+    environ = request.environ
+
+    original_uri = environ.get('HTTP_X_ORIGINAL_REQUEST_URI', '/')
     parsed_path = urlparse(original_uri).path
     
-    remote_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    remote_ip = environ.get('HTTP_X_FORWARDED_FOR') or request.remote_addr
 
     try:
-        frappe.set_user("Administrator")
+        if switch_user:
+            frappe.set_user("Administrator")
 
         handler = None
         is_ebkn = False
@@ -47,16 +57,19 @@ def handle_request():
             is_ebkn = True
         
         if not handler:
-            logger.warning(f"No registered handler for path: {parsed_path}")
+            logger.warning("No registered handler for path: %s", parsed_path)
             return Response(f"No handler for path: {parsed_path}", status=404)
 
         # Reconstruct headers: Copy all original headers, then alter/add specific ones.
         reconstructed_headers = dict(request.headers)
         if is_ebkn:
-            for nginx_header, original_header in NGINX_TO_ORIGINAL_HEADERS.items():
-                if nginx_header in request.headers:
-                    reconstructed_headers[original_header] = request.headers[nginx_header]
+            for environ_key, original_header in _NGINX_ENVIRON_HEADERS:
+                value = environ.get(environ_key)
+                if value is not None:
+                    reconstructed_headers[original_header] = value
 
+        # Frappe has already read and cached the body while building form_dict,
+        # so request.stream is exhausted here; always take the cached bytes.
         raw_body = request.get_data(cache=False)
         
         # SIMPLIFIED: Call all handlers with the same, consistent signature.
@@ -70,19 +83,22 @@ def handle_request():
         elif isinstance(handler_output, Response):
             response = handler_output
         else:
-            logger.error(f"Handler for {parsed_path} returned an invalid type: {type(handler_output)}")
+            logger.error("Handler for %s returned an invalid type: %s", parsed_path, type(handler_output))
             return Response("Internal Server Error: Invalid handler response", status=500)
         
         if response.status_code != 200 :
-            logger.info(f"Request from {remote_ip} for path '{parsed_path}'")
-            logger.info(f"Response for {parsed_path}: Status: {response.status_code}")
+            logger.info("Request from %s for path '%s'", remote_ip, parsed_path)
+            logger.info("Response for %s: Status: %s", parsed_path, response.status_code)
         return response
 
-    except Exception as e:
-        frappe.log_error(title=f"Error handling request for path {parsed_path}", message=frappe.get_traceback())
+    except Exception:
+        # Log to the listener file rather than an Error Log document: if the failure
+        # came from the database, inserting into it would fail or stall as well.
+        logger.error("Error handling request for path %s", parsed_path, exc_info=True)
         return Response("Internal Server Error", status=500)
     finally:
-        frappe.set_user(original_user or "Guest")
+        if switch_user:
+            frappe.set_user(original_user or "Guest")
         frappe.db.commit()
 @frappe.whitelist()
 def sync_hikvision_device():
@@ -51,3 +51,19 @@ def get_erp_employee_id(device_employee_id: str) -> str | None:
     except Exception:
         frappe.log_error(title="ID Mapping Exception", message=frappe.get_traceback())
         return None
+
+def get_erp_employee_ids(device_employee_ids) -> dict:
+    """Converts several Device Employee IDs to ERP Employee IDs with one query. IDs with no match are left out."""
+    device_employee_ids = {d for d in device_employee_ids if d}
+    if not device_employee_ids:
+        return {}
+    settings = frappe.get_cached_doc("Biometric Integration Settings")
+    field = settings.device_id_field or "attendance_device_id"
+    try:
+        return {
+            row[field]: row.name
+            for row in frappe.get_all("Employee", filters={field: ["in", list(device_employee_ids)]}, fields=["name", field])
+        }
+    except Exception:
+        frappe.log_error(title="ID Mapping Exception", message=frappe.get_traceback())
+        return {}
@@ -33,4 +33,89 @@ class TestBiometricIntegrationBasic(FrappeTestCase):
 
         status = get_status_logic("test_site")
         self.assertIn("status", status)
-        self.assertEqual(status["status"], "disabled")  # Should be disabled by default
\ No newline at end of file
+        self.assertEqual(status["status"], "disabled")  # Should be disabled by default
+
+    def test_ebkn_bin_extraction(self):
+        """Test splitting EBKN payloads into JSON meta and binary segments"""
+        from biometric_integration.services.ebkn_processor import _extract_json_and_bins
+
+        meta, bins = _extract_json_and_bins(b'{"user_id":"00000001","data":"BIN_1"}\x01\x02\x03')
+        self.assertEqual(meta["user_id"], "00000001")
+        self.assertEqual(bins, {"BIN_1": b"\x01\x02\x03"})
+
+        meta, bins = _extract_json_and_bins(b'{"a":"BIN_1","b":["BIN_2"]}abcde')
+        self.assertEqual(bins, {"BIN_1": b"ab", "BIN_2": b"cde"})
+
+    def test_bs_comm_buffer(self):
+        """Test EBKN command body framing"""
+        from biometric_integration.services.ebkn_processor import create_bs_comm_buffer
+
+        self.assertEqual(create_bs_comm_buffer(b"abc"), b"\x04\x00\x00\x00abc\x00")
+        self.assertEqual(create_bs_comm_buffer(b""), b"\x01\x00\x00\x00\x00")
+        with self.assertRaises(TypeError):
+            create_bs_comm_buffer("abc")
+
+    def test_ebkn_multi_block_upload(self):
+        """Test EBKN block sequencing: restart, out-of-order rejection and final assembly"""
+        import os
+        import tempfile
+        from unittest.mock import patch
+        from biometric_integration.services import ebkn_processor as ebkn
+
+        received = []
+        def capture(meta, headers, raw):
+            received.append((meta, bytes(raw)))
+            return ebkn.reply_response_code()
+
+        def send(blk_no, data):
+            headers = {"request_code": "test_upload", "dev_id": "TEST_EBKN", "blk_no": str(blk_no)}
+            return ebkn.handle_request(data, headers)
+
+        payload = b'{"user_id":"00000001","data":"BIN_1"}\x01\x02\x03\x04'
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(ebkn, "BLOCK_MAP_PATH", os.path.join(tmp, "block_map.json")), \
+                patch.object(ebkn, "_PARTIAL_PREFIX", os.path.join(tmp, "")), \
+                patch.dict(ebkn.REQUEST_ROUTER, {"test_upload": capture}):
+            # A first attempt whose header fits in block 1 records its end offset...
+            self.assertEqual(send(1, b'{"user_id":"x"}')[1], 200)
+            self.assertEqual(ebkn._get_header_end("TEST_EBKN", "test_upload"), 14)
+
+            # ...which a restart whose header spills past block 1 must clear.
+            self.assertEqual(send(1, payload[:10])[1], 200)
+            self.assertIsNone(ebkn._get_header_end("TEST_EBKN", "test_upload"))
+
+            self.assertEqual(send(2, payload[10:25])[1], 200)
+            body, status, _ = send(4, payload[25:38])
+            self.assertEqual(status, 400)
+            self.assertIn(b"Block sequence mismatch", body)
+
+            self.assertEqual(send(3, payload[25:38])[1], 200)
+            self.assertEqual(send(0, payload[38:])[1], 200)
+
+            self.assertEqual(len(received), 1)
+            meta, raw = received[0]
+            self.assertEqual(raw, payload)
+            self.assertEqual(meta["user_id"], "00000001")
+            self.assertEqual(meta["data"], "AQIDBA==")
+            self.assertIsNone(ebkn._get_last_block("TEST_EBKN", "test_upload"))
+
+    def test_logger_from_forked_child(self):
+        """Test that records logged by a child leaving through os._exit reach the log file"""
+        import os
+        import uuid
+        from biometric_integration.services.logger import logger, _LOG_FILE
+
+        marker = f"fork-log-test-{uuid.uuid4().hex}"
+        pid = os.fork()
+        if pid == 0:
+            # Mirror an RQ work-horse: log, then exit without interpreter cleanup.
+            try:
+                for i in range(50):
+                    logger.info("%s %s", marker, i)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        with open(_LOG_FILE, encoding="utf-8") as fh:
+            lines = [line for line in fh if marker in line]
+        self.assertEqual(len(lines), 50)
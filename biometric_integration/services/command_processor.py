@@ -159,7 +159,7 @@ def _load_blob(url: str) -> Optional[bytes]:
         content = frappe.get_doc("File", file_name).get_content()
         return content if isinstance(content, bytes) else content.encode('utf-8')
     # This is a critical error, so it will be caught and logged by the calling function.
-    logger.error(f"File Not Found for URL: {url}")
+    logger.error("File Not Found for URL: %s", url)
     return None
 
 def _handle_command_build_failure(cmd_doc: frappe.Document, exc: Exception, title: str):
@@ -196,9 +196,6 @@ def _handle_command_build_failure(cmd_doc: frappe.Document, exc: Exception, titl
         )
     except Exception as e:
         # Log a failure within the error handler itself.
-        logger.error(
-            f"Critical Failure in Command Error Handler for {cmd_doc.name}: {e}",
-            exc_info=True
-        )
+        logger.error("Critical Failure in Command Error Handler for %s: %s", cmd_doc.name, e, exc_info=True)
         frappe.db.rollback()
 
@@ -5,19 +5,30 @@ import frappe
 # Using the full, absolute path for the import.
 from biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings import get_erp_employee_id
 
+CHECKIN_SAVEPOINT = "biometric_checkin"
+
 def create_employee_checkin(
     employee_field_value: str,
     timestamp: datetime,
     device_id: str | None = None,
-    log_type: str | None = None
+    log_type: str | None = None,
+    employee_id: str | None = None,
+    commit: bool = True
 ) -> bool:
     """
     Creates an Employee Checkin record. This version only logs critical,
-    actionable errors.
+    actionable errors. Callers that have already resolved the Employee can
+    pass it as `employee_id` to skip the device ID lookup.
+
+    Batch callers pass `commit=False` and commit once themselves; a failed
+    insert then only rolls back to its own savepoint, not the whole batch.
     """
     try:
+        if not commit:
+            frappe.db.savepoint(CHECKIN_SAVEPOINT)
+
         settings = frappe.get_cached_doc("Biometric Integration Settings")
-        employee_id = get_erp_employee_id(employee_field_value)
+        employee_id = employee_id or get_erp_employee_id(employee_field_value)
 
         # If employee is not found, either skip silently or proceed to insert
         # a check-in with a blank employee link, based on settings.
@@ -31,7 +42,8 @@ def create_employee_checkin(
         checkin.device_id = device_id
 
         checkin.insert(ignore_mandatory=True if not employee_id else False, ignore_permissions=True)
-        frappe.db.commit()
+        if commit:
+            frappe.db.commit()
 
         return True
 
@@ -50,7 +62,7 @@ def create_employee_checkin(
         return False
 
     except Exception:
-        frappe.db.rollback()
+        frappe.db.rollback(save_point=None if commit else CHECKIN_SAVEPOINT)
         # Log any other unexpected exception as a critical error.
         frappe.log_error(
             title="Failed to Create Employee Check-in",
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import base64
+import functools
 import json
 import os
 import struct
+import threading
 import typing
+from collections import deque
 from datetime import datetime
-from io import BytesIO
 from typing import Any, Callable, Dict, List, Tuple
 
 import frappe
@@ -25,95 +27,208 @@ BENCH_ASSETS_DIR = get_biometric_assets_dir()
 PARTIAL_DIR = os.path.join(BENCH_ASSETS_DIR, "partial_data")
 BLOCK_MAP_PATH = os.path.join(BENCH_ASSETS_DIR, "block_sequence_map.json")
 os.makedirs(PARTIAL_DIR, exist_ok=True)
+_PARTIAL_PREFIX = os.path.join(PARTIAL_DIR, "")
 REQ_RECV_CMD = "receive_cmd"
 REQ_SEND_CMD_RESULT = "send_cmd_result"
 REQ_REALTIME_GLOG = "realtime_glog"
 REQ_REALTIME_ENROLL = "realtime_enroll_data"
 Reply = Tuple[str | bytes, int, Dict[str, str]]
 
-# --- Block‑sequence, partial-file, and JSON/Binary helpers (Unchanged) ---
+# --- Assembly buffer pool ---
+# Multi-block uploads (enrollment templates) are reassembled into large
+# buffers; keep a few per power-of-two bucket instead of reallocating them.
+_BUFFER_MIN_BUCKET = 64 * 1024
+_BUFFER_MAX_BUCKET = 16 * 1024 * 1024
+_BUFFER_POOL: Dict[int, List[bytearray]] = {}
+_BUFFER_POOL_DEPTH = 2
+_BUFFER_POOL_LOCK = threading.Lock()
+def _acquire_buffer(min_size: int) -> bytearray:
+    bucket = max(_BUFFER_MIN_BUCKET, 1 << (min_size - 1).bit_length())
+    if bucket > _BUFFER_MAX_BUCKET: return bytearray(min_size)
+    with _BUFFER_POOL_LOCK:
+        free = _BUFFER_POOL.get(bucket)
+        if free: return free.pop()
+    return bytearray(bucket)
+def _release_buffer(buf: bytearray) -> None:
+    size = len(buf)
+    if size < _BUFFER_MIN_BUCKET or size > _BUFFER_MAX_BUCKET or size & (size - 1): return
+    with _BUFFER_POOL_LOCK:
+        free = _BUFFER_POOL.setdefault(size, [])
+        if len(free) < _BUFFER_POOL_DEPTH: free.append(buf)
+
+# --- Block‑sequence, partial-file, and JSON/Binary helpers ---
+# The block map is shared by all workers through BLOCK_MAP_PATH. Each request
+# refreshes the in-memory copy once per lookup or update; updates mutate that
+# copy and write it through in the same step, without re-reading.
+# The file is only re-parsed when its (inode, mtime, size) stamp changed, i.e.
+# when another worker wrote it. Saves replace the file, but inode numbers get
+# reused, so the stamp is a heuristic: size catches most writes that land in
+# the same mtime tick on a recycled inode.
+_BLOCK_MAP: Dict[str, int] = {}
+_BLOCK_MAP_STAMP: Tuple[int, int, int] | None = None
+_BLOCK_MAP_LOCK = threading.Lock()
+def _stamp_of(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_ino, st.st_mtime_ns, st.st_size
+def _block_map_stamp() -> Tuple[int, int, int] | None:
+    try:
+        return _stamp_of(os.stat(BLOCK_MAP_PATH))
+    except FileNotFoundError:
+        return None
 def _load_block_map() -> Dict[str, int]:
-    if os.path.exists(BLOCK_MAP_PATH):
+    global _BLOCK_MAP, _BLOCK_MAP_STAMP
+    stamp = _block_map_stamp()
+    if stamp is None:
+        _BLOCK_MAP, _BLOCK_MAP_STAMP = {}, None
+    elif stamp != _BLOCK_MAP_STAMP:
         try:
-            with open(BLOCK_MAP_PATH, "r", encoding="utf-8") as fh:
-                return json.load(fh)
+            with open(BLOCK_MAP_PATH, "rb") as fh:
+                _BLOCK_MAP, _BLOCK_MAP_STAMP = json.loads(fh.read()), stamp
         except Exception as exc:
             logger.error("Unable to read block map: %s", exc)
-    return {}
-def _save_block_map(map_obj: Dict[str, int]) -> None:
+    return _BLOCK_MAP
+def _save_block_map() -> None:
+    global _BLOCK_MAP_STAMP
+    tmp_path = f"{BLOCK_MAP_PATH}.{os.getpid()}.tmp"
     try:
-        with open(BLOCK_MAP_PATH, "w", encoding="utf-8") as fh:
-            json.dump(map_obj, fh, indent=2)
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(_BLOCK_MAP, fh, separators=(",", ":"))
+            fh.flush()
+            # Stamp our own file; re-stating after the rename could pick up another worker's write.
+            stamp = _stamp_of(os.fstat(fh.fileno()))
+        os.replace(tmp_path, BLOCK_MAP_PATH)
+        _BLOCK_MAP_STAMP = stamp
     except Exception as exc:
         logger.error("Unable to persist block map: %s", exc)
 def _seq_key(dev_id: str, request_code: str) -> str:
     return f"{dev_id}_{request_code}"
-def _set_last_block(dev_id: str, request_code: str, blk_no: int) -> None:
-    m = _load_block_map()
-    m[_seq_key(dev_id, request_code)] = blk_no
-    _save_block_map(m)
+def _header_key(seq_key: str) -> str:
+    return f"{seq_key}:header_end"
+def _update_block_map(dev_id: str, request_code: str, mutator: Callable[[int | None], int | None], header_end: int | None = None) -> int | None:
+    """Apply *mutator* to the sequence's last block under one load and at most one save; returns the previous value."""
+    key = _seq_key(dev_id, request_code)
+    hkey = _header_key(key)
+    with _BLOCK_MAP_LOCK:
+        block_map = _load_block_map()
+        prev = block_map.get(key)
+        new = mutator(prev)
+        if new is None:
+            changed = block_map.pop(hkey, None) is not None
+            changed = block_map.pop(key, None) is not None or changed
+        else:
+            changed = new != prev
+            block_map[key] = new
+            if new == 1:
+                # A restarted sequence replaces any header offset left by the previous one.
+                changed = changed or block_map.get(hkey) != header_end
+                if header_end is None: block_map.pop(hkey, None)
+                else: block_map[hkey] = header_end
+        if changed: _save_block_map()
+        return prev
 def _get_last_block(dev_id: str, request_code: str) -> int | None:
-    return _load_block_map().get(_seq_key(dev_id, request_code))
+    with _BLOCK_MAP_LOCK:
+        return _load_block_map().get(_seq_key(dev_id, request_code))
+def _get_header_end(dev_id: str, request_code: str) -> int | None:
+    """Offset of the JSON header's closing brace, if block 1 contained the whole header."""
+    return _BLOCK_MAP.get(_header_key(_seq_key(dev_id, request_code)))
 def _clear_sequence(dev_id: str, request_code: str) -> None:
-    m = _load_block_map()
-    m.pop(_seq_key(dev_id, request_code), None)
-    _save_block_map(m)
+    # Cleared through a fresh load so entries other workers wrote meanwhile survive.
+    _update_block_map(dev_id, request_code, lambda _: None)
 def _partial_path(dev_id: str, request_code: str) -> str:
-    return os.path.join(PARTIAL_DIR, f"{dev_id}_{request_code}.bin")
-def _start_sequence(dev_id: str, request_code: str) -> None:
+    return f"{_PARTIAL_PREFIX}{dev_id}_{request_code}.bin"
+# Each block opens the spool, appends and closes it again, so no descriptor
+# outlives its request or is shared between threads; abandoned or spoofed
+# uploads cost disk, not fds.
+_SPOOL_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view: view = view[os.write(fd, view) :]
+def _append_block(dev_id: str, request_code: str, data: bytes, restart: bool = False) -> None:
+    """Append a block to the sequence's spool; *restart* truncates it first (block 1).
+
+    A failed write (e.g. disk full) is cut back off, so the device's retry of
+    that block appends to the same offset.
+    """
+    fd = os.open(_partial_path(dev_id, request_code), _SPOOL_FLAGS | (os.O_TRUNC if restart else 0), 0o644)
+    try:
+        size = os.fstat(fd).st_size
+        try:
+            _write_all(fd, data)
+        except BaseException:
+            os.ftruncate(fd, size)
+            raise
+    finally:
+        os.close(fd)
+def _read_sequence(dev_id: str, request_code: str, tail: bytes = b"") -> memoryview | None:
+    """Assemble the spooled blocks plus *tail* in a pooled buffer; release it with ``_release_buffer``."""
     try:
-        os.remove(_partial_path(dev_id, request_code))
+        with open(_partial_path(dev_id, request_code), "rb") as fh:
+            spooled = os.fstat(fh.fileno()).st_size
+            view = memoryview(_acquire_buffer(spooled + len(tail)))
+            size = fh.readinto(view[:spooled])
     except FileNotFoundError:
-        pass
-    _clear_sequence(dev_id, request_code)
-def _append_block(dev_id: str, request_code: str, data: bytes) -> None:
-    with open(_partial_path(dev_id, request_code), "ab") as fh:
-        fh.write(data)
-def _read_sequence(dev_id: str, request_code: str) -> bytes | None:
-    path = _partial_path(dev_id, request_code)
-    if os.path.exists(path):
-        with open(path, "rb") as fh:
-            return fh.read()
-    return None
-def _extract_json_and_bins(raw: bytes) -> Tuple[dict, Dict[str, bytes]]:
-    text = raw.decode("utf-8", errors="replace")
-    start = text.find("{")
+        return None
+    view[size : size + len(tail)] = tail
+    return view[: size + len(tail)]
+def _collect_placeholders(meta: Any, out: List[str]) -> None:
+    """Append every ``BIN_*`` placeholder in *meta* to *out*, in document order."""
+    stack = deque([meta])
+    while stack:
+        obj = stack.pop()
+        if type(obj) is dict: stack.extend(reversed(obj.values()))
+        elif type(obj) is list: stack.extend(reversed(obj))
+        elif type(obj) is str and obj.startswith("BIN_"): out.append(obj)
+def _json_span(data: bytes | bytearray, limit: int) -> Tuple[int, int]:
+    """Byte offsets of the leading JSON object's outer braces within ``data[:limit]``."""
+    start = data.find(b"{", 0, limit)
     if start == -1:
         raise ValueError("no JSON opening brace found")
-    brace, end = 0, -1
-    for idx, ch in enumerate(text[start:], start=start):
-        if ch == "{": brace += 1
-        elif ch == "}":
-            brace -= 1
-            if brace == 0:
-                end = idx
-                break
-    if end == -1: raise ValueError("unbalanced JSON braces")
-    meta = json.loads(text[start : end + 1])
-    remaining, placeholders = raw[end + 1 :], []
-    def _recurse(obj: Any) -> None:
-        if isinstance(obj, dict): [ _recurse(v) for v in obj.values() ]
-        elif isinstance(obj, list): [ _recurse(v) for v in obj ]
-        elif isinstance(obj, str) and obj.startswith("BIN_"): placeholders.append(obj)
-    _recurse(meta)
+    depth, pos = 1, start + 1
+    next_open = data.find(b"{", pos, limit)
+    while True:
+        close = data.find(b"}", pos, limit)
+        if close == -1: raise ValueError("unbalanced JSON braces")
+        while next_open != -1 and next_open < close:
+            depth += 1
+            next_open = data.find(b"{", next_open + 1, limit)
+        depth -= 1
+        if depth == 0: return start, close
+        pos = close + 1
+def _header_end(raw: bytes) -> int | None:
+    """Closing-brace offset of the JSON header in a first block, or None if it continues in later blocks."""
+    try: return _json_span(raw, len(raw))[1]
+    except ValueError: return None
+def _extract_json_and_bins(raw: bytes | memoryview, header_end: int | None = None) -> Tuple[dict, Dict[str, memoryview]]:
+    """Split a payload into its JSON header and BIN segments; segments are views into *raw*."""
+    # Pooled payloads are views over the start of a larger bytearray; search that buffer directly.
+    data = raw.obj if isinstance(raw, memoryview) else raw
+    if header_end is None: start, end = _json_span(data, len(raw))
+    else: start, end = data.find(b"{", 0, header_end), header_end
+    meta = json.loads(data[start : end + 1])
+    remaining, placeholders = memoryview(raw)[end + 1 :], []
+    _collect_placeholders(meta, placeholders)
     if not placeholders: return meta, {}
-    segments, seg_size = {}, len(remaining) // len(placeholders)
-    stream = BytesIO(remaining)
-    for idx, ph in enumerate(placeholders, 1):
-        blob = stream.read() if idx == len(placeholders) else stream.read(seg_size)
-        segments[ph] = blob
+    # Single template (the usual enrollment payload): the whole tail is the blob.
+    if len(placeholders) == 1: return meta, {placeholders[0]: remaining}
+    segments, seg_size, last = {}, len(remaining) // len(placeholders), len(placeholders) - 1
+    for idx, ph in enumerate(placeholders):
+        off = idx * seg_size
+        segments[ph] = remaining[off:] if idx == last else remaining[off : off + seg_size]
     return meta, segments
-def _json_with_inlined_bins(meta: dict, bin_map: Dict[str, bytes]) -> dict:
-    def _replace(obj: Any) -> Any:
-        if isinstance(obj, dict): return {k: _replace(v) for k, v in obj.items()}
-        if isinstance(obj, list): return [_replace(v) for v in obj]
-        if isinstance(obj, str) and obj in bin_map: return base64.b64encode(bin_map[obj]).decode()
-        return obj
-    return _replace(meta)
+def _json_with_inlined_bins(meta: dict, bin_map: Dict[str, memoryview]) -> dict:
+    """Replace BIN placeholders in *meta* with their base64 text, in place."""
+    stack: List[Any] = [meta]
+    while stack:
+        obj = stack.pop()
+        for key, value in (obj.items() if type(obj) is dict else enumerate(obj)):
+            if type(value) is str:
+                if value in bin_map: obj[key] = base64.b64encode(bin_map[value]).decode()
+            elif type(value) is dict or type(value) is list: stack.append(value)
+    return meta
 
 # --- Core entry point ---
 def handle_request(raw_data: bytes, headers: Dict[str, str], *, brand: str = "ebkn",) -> Reply:
     """Process a POST from any EBKN device."""
+    full_payload = None
     try:
         request_code = headers.get("request_code", "")
         dev_id = headers.get("dev_id", "")
@@ -124,35 +239,45 @@ def handle_request(raw_data: bytes, headers: Dict[str, str], *, brand: str = "eb
             logger.error("Request failed: Missing 'request_code' or 'dev_id' in reconstructed headers.")
             return _fail("Missing request_code or dev_id")
 
-        last_blk = _get_last_block(dev_id, request_code)
+        header_end = None
         if blk_no == 1:
-            _start_sequence(dev_id, request_code)
-            _append_block(dev_id, request_code, raw_data)
-            _set_last_block(dev_id, request_code, 1)
+            # The JSON header normally fits in the first block; locate it now so the
+            # final pass only has to parse it.
+            _append_block(dev_id, request_code, raw_data, restart=True)
+            _update_block_map(dev_id, request_code, lambda _: 1, header_end=_header_end(raw_data))
             return _ok_after_block()
         if blk_no > 1:
+            last_blk = _get_last_block(dev_id, request_code)
             if last_blk is None or blk_no != last_blk + 1:
                 return _fail("Block sequence mismatch")
+            # The block only counts as received once it is fully spooled.
             _append_block(dev_id, request_code, raw_data)
-            _set_last_block(dev_id, request_code, blk_no)
+            _update_block_map(dev_id, request_code, lambda prev: blk_no if prev == blk_no - 1 else prev)
             return _ok_after_block()
+        last_blk = _get_last_block(dev_id, request_code)
         if last_blk is None: full_payload = raw_data
         else:
-            _append_block(dev_id, request_code, raw_data)
-            _set_last_block(dev_id, request_code, 0)
-            full_payload = _read_sequence(dev_id, request_code)
+            # The final block is copied straight into the assembly buffer rather than
+            # appended to the spool and read back. The spool itself stays on disk
+            # because earlier blocks may have been received by another worker.
+            header_end = _get_header_end(dev_id, request_code)
+            full_payload = _read_sequence(dev_id, request_code, tail=raw_data)
             if full_payload is None: return _fail("Unable to read spooled data")
             _clear_sequence(dev_id, request_code)
 
-        meta, bins = _extract_json_and_bins(full_payload)
-        meta = _json_with_inlined_bins(meta, bins)
-        meta["device_id"] = dev_id
         handler = REQUEST_ROUTER.get(request_code)
         if handler is None: return _fail("Unsupported request_code")
+        if request_code in UNPARSED_REQUESTS or not full_payload: meta = {}
+        else:
+            meta, bins = _extract_json_and_bins(full_payload, header_end)
+            if bins: _json_with_inlined_bins(meta, bins)
+        meta["device_id"] = dev_id
         return handler(meta, headers, full_payload)
     except Exception as exc:
         logger.error("EBKN processor fatal: %s", exc, exc_info=True)
         return _fail("Internal server error")
+    finally:
+        if isinstance(full_payload, memoryview): _release_buffer(full_payload.obj)
 
 # --- Generic response helpers (Unchanged) ---
 def reply_response_code(response_code: str = "OK", *, trans_id: str = "0", cmd_code: str = "", body: bytes | str = b"", **extra_headers: str,) -> Reply:
@@ -160,16 +285,28 @@ def reply_response_code(response_code: str = "OK", *, trans_id: str = "0", cmd_c
     headers: Dict[str, str] = {"response_code": response_code, "trans_id": trans_id, **extra_headers}
     if cmd_code: headers["cmd_code"] = cmd_code
     return body_bytes, 200, headers
+# Empty "no pending command" reply; werkzeug copies the headers, so the dict is safe to share.
+_EMPTY_OK_REPLY: Reply = (b"", 200, {"response_code": "OK", "trans_id": "0"})
+def _empty_ok(trans_id: str) -> Reply:
+    if trans_id == "0": return _EMPTY_OK_REPLY
+    return b"", 200, {"response_code": "OK", "trans_id": trans_id}
 def _ok_after_block() -> Reply:
     return reply_response_code("OK")
+@functools.lru_cache(maxsize=32)
+def _fail_body(msg: str) -> bytes:
+    # Error messages are a small fixed set; encode each one once.
+    return json.dumps({"error": msg}).encode("utf-8")
 def _fail(msg: str) -> Reply:
-    return (json.dumps({"error": msg}), 400, {"response_code": "ERROR"})
+    return (_fail_body(msg), 400, {"response_code": "ERROR"})
 
 # --- Request-specific handlers ---
 def _handle_realtime_glog(payload: dict, headers: Dict[str, str], raw: bytes) -> Reply:
     try:
         user_id = int(payload["user_id"])
-        ts = datetime.strptime(payload["io_time"], "%Y-%m-%d %H:%M:%S")
+        io_time = payload["io_time"]
+        # Only "YYYY-MM-DD HH:MM:SS"; fromisoformat alone would also take bare dates and offsets.
+        if len(io_time) != 19: raise ValueError(f"unexpected io_time {io_time!r}")
+        ts = datetime.fromisoformat(io_time)
         log_type = "IN" if payload.get("io_mode") == 1 else "OUT"
         ok = create_employee_checkin(
             employee_field_value=user_id,
@@ -184,7 +321,8 @@ def _handle_realtime_glog(payload: dict, headers: Dict[str, str], raw: bytes) ->
 
 def create_bs_comm_buffer(payload: bytes) -> bytes:
     if not isinstance(payload, (bytes, bytearray)): raise TypeError("payload must be bytes")
-    return struct.pack("<I", len(payload) + 1) + payload + b"\x00"
+    # <u32 length incl. NUL><payload><NUL>; join sizes the result once and copies the payload once.
+    return b"".join((struct.pack("<I", len(payload) + 1), payload, b"\x00"))
 def _format_cmd_body(raw: typing.Union[str, bytes, None]) -> bytes:
     if raw is None: return b""
     if isinstance(raw, bytes): return raw
@@ -196,7 +334,7 @@ def _handle_receive_cmd(payload: dict, headers: Dict[str, str], raw: bytes) -> R
     trans_id = headers.get("trans_id", "0")
     try:
         cmd = process_device_command(dev_id)
-        if not cmd: return reply_response_code("OK", trans_id=trans_id)
+        if not cmd: return _empty_ok(trans_id)
         body_bytes = _format_cmd_body(cmd.get("body"))
         trans_id = cmd.get("trans_id") or trans_id
         cmd_code = cmd.get("cmd_code", "")
@@ -214,7 +352,7 @@ def _handle_send_cmd_result(payload: dict, headers: Dict[str, str], raw: bytes)
         try:
             cmd_doc = frappe.get_doc("Biometric Device Command", trans_id)
         except frappe.DoesNotExistError:
-            logger.error(f"send_cmd_result for device {dev_id}: command doc '{trans_id}' not found")
+            logger.error("send_cmd_result for device %s: command doc '%s' not found", dev_id, trans_id)
             return reply_response_code("OK", trans_id=trans_id)
         cmd_doc.no_of_attempts = (cmd_doc.no_of_attempts or 0) + 1
         line = f"[{now()}] {cmd_return_code}"
@@ -226,7 +364,7 @@ def _handle_send_cmd_result(payload: dict, headers: Dict[str, str], raw: bytes)
         cmd_doc.save(ignore_permissions=True)
         frappe.db.commit()
         if (cmd_doc.command_type == "Get Enroll Data" and cmd_return_code == "OK" and (blk_no_raw is None or blk_no_raw == "0")):
-            _store_get_user_info_blob(dev_id=dev_id, user_id=payload.get("user_id", ""), blob=raw)
+            _store_get_user_info_blob(dev_id=dev_id, user_id=payload.get("user_id", ""), blob=bytes(raw))
     except Exception as exc:
         frappe.db.rollback()
         logger.error("Failed updating command %s: %s", trans_id, exc, exc_info=True)
@@ -245,16 +383,21 @@ def _handle_realtime_enroll_data(payload: dict, headers: Dict[str, str], raw: by
     if not user_id_raw: return _fail("user_id missing")
     user_id = user_id_raw.lstrip("0") or user_id_raw
     try:
-        docname = frappe.db.exists("Biometric Device User", {"user_id": user_id})
-        user_doc = (frappe.get_doc("Biometric Device User", docname) if docname else frappe.get_doc({"doctype": "Biometric Device User", "user_id": user_id}))
-        if not docname:
+        device_row = {"biometric_device": dev_id, "brand": "EBKN", "enroll_data_source": 0}
+        docname = frappe.db.get_value("Biometric Device User", {"user_id": user_id}, "name")
+        if docname:
+            user_doc = frappe.get_doc("Biometric Device User", docname, for_update=True)
+            device_ids = {d.biometric_device for d in user_doc.devices}
+            if dev_id not in device_ids:
+                user_doc.append("devices", device_row)
+                user_doc.save(ignore_permissions=True)
+        else:
+            # New user: link the device before the insert so a single write does both.
+            user_doc = frappe.get_doc({"doctype": "Biometric Device User", "user_id": user_id, "devices": [device_row]})
             try:
                 if emp := get_erp_employee_id(user_id): user_doc.employee = emp
             except Exception: pass
             user_doc.insert(ignore_permissions=True)
-        if not any(d.biometric_device == dev_id for d in user_doc.devices):
-            user_doc.append("devices", {"biometric_device": dev_id, "brand": "EBKN", "enroll_data_source": 0})
-            user_doc.save(ignore_permissions=True)
         frappe.db.commit()
         _queue_get_user_info(dev_id, user_doc.name)
         return _ok_after_block()
@@ -285,6 +428,8 @@ REQUEST_ROUTER: Dict[str, Callable[[dict, Dict[str, str], bytes], Reply]] = {
     REQ_RECV_CMD: _handle_receive_cmd,
     REQ_SEND_CMD_RESULT: _handle_send_cmd_result,
 }
-def handle_ebkn(_: Any, raw: bytes, headers: Dict[str, str]) -> Reply:
+# Requests whose handlers never look at the JSON body; command polls are the bulk of the traffic.
+UNPARSED_REQUESTS = frozenset({REQ_RECV_CMD})
+def handle_ebkn(_: Any, raw: bytes, headers: Dict[str, str], path: str = "") -> Reply:
     """Adapter compatible with api.py expectation."""
     return handle_request(raw, headers, brand="ebkn")
@@ -3,13 +3,25 @@
 
 import frappe
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 import json
+import logging
 from werkzeug.wrappers import Response
 
 from biometric_integration.services.logger import logger
-from biometric_integration.services.create_checkin import create_checkin_log
+from biometric_integration.services.create_checkin import create_employee_checkin
+
+# Events requested per page; devices may return fewer.
+BATCH_SIZE = 100
+# Concurrent page requests per device. Devices are small embedded servers, so keep this low.
+FETCH_WORKERS = 4
+# (connect, read) timeouts in seconds, so an unreachable device cannot hold a worker for minutes.
+REQUEST_TIMEOUT = (5, 30)
 
 def handle_hikvision(request, raw_body, headers, parsed_path):
     """
@@ -25,7 +37,7 @@ def handle_hikvision(request, raw_body, headers, parsed_path):
         return Response("Not Found", status=404)
         
     except Exception as e:
-        logger.error(f"Error in Hikvision handler: {str(e)}")
+        logger.error("Error in Hikvision handler: %s", e)
         frappe.log_error(title="Hikvision Handler Error", message=frappe.get_traceback())
         return Response("Internal Server Error", status=500)
 
@@ -94,6 +106,23 @@ def sync_hikvision_attendance(device_serial=None, start_time=None, end_time=None
         frappe.log_error(title="Hikvision Sync Error", message=frappe.get_traceback())
         return {"error": f"Error syncing attendance: {str(e)}"}
 
+def _fetch_events(session, url, headers, search_cond, position):
+    """
+    Fetch one page of access-control events starting at the given position.
+    Returns None if the device rejects the request, the request fails (timeout,
+    connection error) or the reply is not valid JSON, so the caller keeps the
+    pages fetched before it.
+    """
+    payload = {"AcsEventCond": {**search_cond, "searchResultPosition": position}}
+    try:
+        response = session.post(url, headers=headers, json=payload, verify=False, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 200:
+            return None
+        return response.json().get("AcsEvent", {}).get("InfoList", [])
+    except (requests.RequestException, ValueError) as e:
+        logger.error("Error fetching events at position %s from %s: %s", position, url, e)
+        return None
+
 def sync_device_attendance(device, start_time, end_time):
     """
     Sync attendance data from a specific Hikvision device.
@@ -104,71 +133,69 @@ def sync_device_attendance(device, start_time, end_time):
         
         headers = {"Content-Type": "application/json"}
         
-        # Initial fetch to determine total records
-        payload = {
-            "AcsEventCond": {
-                "searchID": "123456789",
-                "searchResultPosition": 0,
-                "maxResults": 10,
-                "major": 0,
-                "minor": 0,
-                "startTime": start_time,
-                "endTime": end_time
-            }
+        # One session for every page so connections and the digest nonce are reused.
+        session = requests.Session()
+        session.auth = HTTPDigestAuth(device.hikvision_username, decrypted_password)
+        session.mount("http://", HTTPAdapter(
+            pool_connections=FETCH_WORKERS,
+            pool_maxsize=FETCH_WORKERS,
+            max_retries=Retry(total=2)
+        ))
+        
+        search_cond = {
+            "searchID": "123456789",
+            "maxResults": BATCH_SIZE,
+            "major": 0,
+            "minor": 0,
+            "startTime": start_time,
+            "endTime": end_time
         }
         
-        response = requests.post(
+        # Initial fetch to determine total records; its events are the first page.
+        response = session.post(
             url,
-            auth=HTTPDigestAuth(device.hikvision_username, decrypted_password),
             headers=headers,
-            json=payload,
+            json={"AcsEventCond": {**search_cond, "searchResultPosition": 0}},
             verify=False,
-            timeout=600
+            timeout=REQUEST_TIMEOUT
         )
         
         if response.status_code != 200:
-            logger.error(f"Failed to fetch attendance logs from device {device.name}. Status: {response.status_code}")
+            logger.error("Failed to fetch attendance logs from device %s. Status: %s", device.name, response.status_code)
             return {"error": f"Failed to fetch attendance logs. Status: {response.status_code}"}
         
         data = response.json()
         total_records = data.get("AcsEvent", {}).get("totalMatches", 0)
         
         if total_records == 0:
-            logger.info(f"No attendance records found for device {device.name} for the given time period")
+            logger.info("No attendance records found for device %s for the given time period", device.name)
             return {"message": "No attendance records found for the given time period", "synced": 0, "skipped": 0}
         
         if total_records > 1500:
-            logger.warning(f"Too many records ({total_records}) for device {device.name}. Limiting to prevent timeout.")
+            logger.warning("Too many records (%s) for device %s. Limiting to prevent timeout.", total_records, device.name)
             return {"error": "Too many records to process. Please reduce the date range and try again."}
         
         count = 0  # Successfully synced records
         skipped = 0  # Skipped duplicates
-        position = 0
-        batch_size = 10
         
-        logger.info(f"Starting sync for device {device.name}. Total records: {total_records}")
+        logger.info("Starting sync for device %s. Total records: %s", device.name, total_records)
         
-        while True:
-            payload["AcsEventCond"]["searchResultPosition"] = position
-            payload["AcsEventCond"]["maxResults"] = batch_size
-            
-            response = requests.post(
-                url,
-                auth=HTTPDigestAuth(device.hikvision_username, decrypted_password),
-                headers=headers,
-                json=payload,
-                verify=False,
-                timeout=600
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch batch at position {position} for device {device.name}")
-                break
-            
-            data = response.json()
-            events = data.get("AcsEvent", {}).get("InfoList", [])
-            
-            if not events:
+        # Devices may cap maxResults below what we ask for, so page by what they actually return.
+        first_page = data.get("AcsEvent", {}).get("InfoList", [])
+        page_size = len(first_page)
+        positions = range(page_size, total_records, page_size) if page_size else range(0)
+        
+        # Fetch the remaining pages concurrently; events are still written serially below.
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            pages = list(pool.map(
+                lambda position: _fetch_events(session, url, headers, search_cond, position),
+                positions
+            ))
+        
+        attendance = []
+        for position, events in zip(chain([0], positions), chain([first_page], pages)):
+            if events is None:
+                logger.error("Failed to fetch batch at position %s for device %s", position, device.name)
                 break
             
             for log in events:
@@ -184,89 +211,115 @@ def sync_device_attendance(device, start_time, end_time):
                 
                 # Convert device time format to datetime
                 try:
-                    event_datetime = datetime.strptime(event_timestamp[:19], '%Y-%m-%dT%H:%M:%S')
+                    # The first 19 characters must be a full "YYYY-MM-DDTHH:MM:SS"; fromisoformat
+                    # would otherwise accept a truncated date as midnight.
+                    if len(event_timestamp) < 19:
+                        raise ValueError(event_timestamp)
+                    event_datetime = datetime.fromisoformat(event_timestamp[:19])
                 except ValueError:
-                    logger.warning(f"Invalid timestamp format: {event_timestamp}")
+                    logger.warning("Invalid timestamp format: %s", event_timestamp)
                     continue
                 
                 # Map attendance status
                 log_type = "IN" if attendance_status == "checkIn" else "OUT"
-                
-                # Create or find employee
-                employee = find_or_create_employee(emp_no)
-                if not employee:
-                    logger.warning(f"Could not find or create employee for emp_no: {emp_no}")
-                    continue
-                
-                # Check if this checkin already exists
-                existing_checkin = frappe.db.exists('Employee Checkin', {
-                    'employee': employee,
-                    'time': event_datetime,
-                    'log_type': log_type,
-                    'device_id': device.name
-                })
-                
-                if existing_checkin:
-                    skipped += 1
-                    continue
-                
-                # Create new checkin record
-                try:
-                    checkin_doc = create_checkin_log(
-                        employee=employee,
-                        timestamp=event_datetime,
-                        device_id=device.name,
-                        log_type=log_type
-                    )
-                    
-                    if checkin_doc:
-                        count += 1
-                        logger.debug(f"Created checkin for employee {employee} at {event_datetime}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to create checkin for employee {employee}: {str(e)}")
-                    continue
+                attendance.append((emp_no, event_datetime, log_type))
+        
+        # Resolve employees and existing checkins once for the whole batch.
+        employees = find_employees({emp_no for emp_no, _, _ in attendance})
+        existing = get_existing_checkins(device.name, [event_datetime for _, event_datetime, _ in attendance])
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        
+        for emp_no, event_datetime, log_type in attendance:
+            employee = employees.get(emp_no)
+            if not employee:
+                continue
             
-            position += batch_size
+            key = (employee, event_datetime, log_type)
+            if key in existing:
+                skipped += 1
+                continue
             
-            if len(events) < batch_size:
-                break
+            # Create new checkin record
+            try:
+                created = create_employee_checkin(
+                    employee_field_value=emp_no,
+                    employee_id=employee,
+                    timestamp=event_datetime,
+                    device_id=device.name,
+                    log_type=log_type,
+                    commit=False
+                )
+                
+                if created:
+                    count += 1
+                    existing.add(key)
+                    if debug_enabled:
+                        logger.debug("Created checkin for employee %s at %s", employee, event_datetime)
+                
+            except Exception as e:
+                logger.error("Failed to create checkin for employee %s: %s", employee, e)
+                continue
         
+        # Checkins are inserted without committing; commit the whole sync once.
         frappe.db.commit()
         
         result_msg = f"Synced {count} attendance records successfully. {skipped} duplicate records skipped."
-        logger.info(f"Device {device.name}: {result_msg}")
+        logger.info("Device %s: %s", device.name, result_msg)
         
         return {"message": result_msg, "synced": count, "skipped": skipped}
         
     except Exception as e:
-        logger.error(f"Error syncing attendance for device {device.name}: {str(e)}")
+        frappe.db.rollback()
+        logger.error("Error syncing attendance for device %s: %s", device.name, e)
         frappe.log_error(title=f"Hikvision Sync Error - {device.name}", message=frappe.get_traceback())
         return {"error": f"Error syncing attendance: {str(e)}"}
 
-def find_or_create_employee(emp_no):
+def find_employees(emp_nos):
     """
-    Find employee by employee number or create if not exists.
+    Map device employee numbers to Employee names, matching on the employee ID
+    first and then on user_id. Numbers that match neither are left out.
     """
+    if not emp_nos:
+        return {}
+    
     try:
-        # First try to find by employee ID
-        employee = frappe.db.get_value('Employee', {'employee': emp_no}, 'name')
-        if employee:
-            return employee
-        
-        # Try to find by user_id (if you use a different field for device employee number)
-        employee = frappe.db.get_value('Employee', {'user_id': emp_no}, 'name')
-        if employee:
-            return employee
-        
-        # If not found, you might want to create or return None
-        # For now, let's return None and log the missing employee
-        logger.warning(f"Employee with number {emp_no} not found in system")
-        return None
+        found = {
+            row.employee: row.name
+            for row in frappe.get_all('Employee', filters={'employee': ['in', list(emp_nos)]}, fields=['name', 'employee'])
+        }
+        
+        # Try to find the rest by user_id (if you use a different field for device employee number)
+        missing = [emp_no for emp_no in emp_nos if emp_no not in found]
+        if missing:
+            for row in frappe.get_all('Employee', filters={'user_id': ['in', missing]}, fields=['name', 'user_id']):
+                found.setdefault(row.user_id, row.name)
+        
+        for emp_no in emp_nos:
+            if emp_no not in found:
+                logger.warning("Employee with number %s not found in system", emp_no)
+        
+        return found
         
     except Exception as e:
-        logger.error(f"Error finding employee {emp_no}: {str(e)}")
-        return None
+        logger.error("Error finding employees %s: %s", sorted(emp_nos), e)
+        return {}
+
+def get_existing_checkins(device_name, timestamps):
+    """
+    Return (employee, time, log_type) for the device's checkins within the
+    span of the given timestamps.
+    """
+    if not timestamps:
+        return set()
+    
+    rows = frappe.get_all('Employee Checkin',
+        filters={
+            'device_id': device_name,
+            'time': ['between', [min(timestamps), max(timestamps)]]
+        },
+        fields=['employee', 'time', 'log_type']
+    )
+    return {(row.employee, row.time, row.log_type) for row in rows}
 
 @frappe.whitelist()
 def scheduled_hikvision_sync():
@@ -308,13 +361,13 @@ def scheduled_hikvision_sync():
                     total_skipped += result['skipped']
                 
             except Exception as e:
-                logger.error(f"Error in scheduled sync for device {device_data.name}: {str(e)}")
+                logger.error("Error in scheduled sync for device %s: %s", device_data.name, e)
                 continue
         
-        logger.info(f"Scheduled Hikvision sync completed. Total synced: {total_synced}, Total skipped: {total_skipped}")
+        logger.info("Scheduled Hikvision sync completed. Total synced: %s, Total skipped: %s", total_synced, total_skipped)
         
     except Exception as e:
-        logger.error(f"Error in scheduled Hikvision sync: {str(e)}")
+        logger.error("Error in scheduled Hikvision sync: %s", e)
         frappe.log_error(title="Scheduled Hikvision Sync Error", message=frappe.get_traceback())
 
 
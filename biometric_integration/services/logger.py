@@ -6,10 +6,16 @@ import os
 from logging.handlers import RotatingFileHandler
 from frappe.utils import get_bench_path
 
+_LOG_FILE = os.path.join(get_bench_path(), "logs", "biometric_listener.log")
+_FORMATTER = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
 def get_biometric_logger():
     """
     Configures and returns a dedicated, rotating logger for the biometric integration service.
     This ensures all related logs are written to a single, size-managed file.
+
+    Records are written synchronously: RQ work-horses leave through os._exit,
+    which would drop anything still waiting in a background queue.
     """
     logger_name = "biometric_listener"
     logger = logging.getLogger(logger_name)
@@ -18,14 +24,10 @@ def get_biometric_logger():
     if not logger.handlers:
         logger.setLevel(logging.INFO)
         
-        log_file = os.path.join(get_bench_path(), "logs", "biometric_listener.log")
-        
         # Use RotatingFileHandler to keep logs lightweight.
         # This will create up to 5 backup files of 1MB each.
-        handler = RotatingFileHandler(log_file, maxBytes=1024*1024, backupCount=5)
-        
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
+        handler = RotatingFileHandler(_LOG_FILE, maxBytes=1024*1024, backupCount=5)
+        handler.setFormatter(_FORMATTER)
         
         logger.addHandler(handler)
         
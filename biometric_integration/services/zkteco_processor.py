@@ -4,16 +4,59 @@
 from __future__ import annotations
 import frappe
 from werkzeug.wrappers import Request, Response
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import parse_qs
 from datetime import datetime
+from collections import defaultdict
 import re
+import time
 
 # Use full paths for robust imports as required by the Frappe framework.
 from biometric_integration.services.command_processor import process_device_command
 from biometric_integration.services.create_checkin import create_employee_checkin
 from biometric_integration.biometric_integration.doctype.biometric_device_user.biometric_device_user import get_or_create_user_by_pin, save_enrollment_data
+from biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings import get_erp_employee_ids
 from biometric_integration.services.logger import logger
 
+_KV_RE = re.compile(r'(\w+)=(\S+)')
+_FP_RE = re.compile(r'FP PIN=(\S+)\s+FID=(\d+)\s+Size=(\d+)\s+Valid=(\d+)\s+TMP=(.*)')
+
+# Everything in the handshake reply after the ATTLOG stamp is fixed.
+_HS_PREFIX = "GET OPTION FROM: "
+_HS_SUFFIX = """
+OPERLOGStamp=9999
+ATTPHOTOStamp=None
+ErrorDelay=30
+Delay=10
+TransTimes=00:00;14:05
+TransInterval=1
+TransFlag=TransData AttLog OpLog AttPhoto EnrollUser ChgUser EnrollFP ChgFP UserPic
+TimeZone=6
+Realtime=1
+Encrypt=None
+"""
+
+# Per-worker cache of each device's handshake reply, built from its
+# last_synced_id, as {sn: (body, expires_at)}. Handshakes arrive every few
+# seconds per device; a stale entry only makes the device resend logs that are
+# then skipped as duplicates. Only registered devices are cached, and the dict
+# is capped because the handshake endpoint is open to guests.
+LAST_SYNC_TTL = 30
+LAST_SYNC_CACHE_MAX = 1024
+_LAST_SYNC_CACHE: dict[str, tuple[str, float]] = {}
+
+def _handshake_body(sn: str, last_sync_id) -> str:
+    return f"{_HS_PREFIX}{sn}\nATTLOGStamp={last_sync_id}{_HS_SUFFIX}"
+
+def _cache_handshake(sn: str, body: str) -> None:
+    now = time.monotonic()
+    if sn not in _LAST_SYNC_CACHE and len(_LAST_SYNC_CACHE) >= LAST_SYNC_CACHE_MAX:
+        for key, (_, expires_at) in list(_LAST_SYNC_CACHE.items()):
+            if expires_at <= now:
+                _LAST_SYNC_CACHE.pop(key, None)
+        if len(_LAST_SYNC_CACHE) >= LAST_SYNC_CACHE_MAX:
+            return
+    _LAST_SYNC_CACHE[sn] = (body, now + LAST_SYNC_TTL)
+
 # --- Response Helpers ---
 
 def plain_text_response(body: str, status_code: int = 200) -> Response:
@@ -24,45 +67,31 @@ def plain_text_response(body: str, status_code: int = 200) -> Response:
 
 def _parse_key_value_data(body_str: str) -> dict:
     """Parses ZKTeco's unique key=value format."""
-    data = {}
-    pairs = re.findall(r'(\w+)=(\S+)', body_str)
-    for key, value in pairs:
-        data[key] = value
-    return data
+    return dict(_KV_RE.findall(body_str))
 
 # --- Request Handlers ---
 
-def _handle_cdata_get(query_params: dict) -> Response:
+def _handle_cdata_get(sn: str | None, table: str | None, raw_body: bytes) -> Response:
     """Handles the initial handshake from the device (GET /iclock/cdata)."""
-    sn = query_params.get("SN", [None])[0]
-    
     if not sn:
         frappe.log_error("ZKTeco handshake failed: Missing Serial Number (SN).", "ZKTeco Processor")
         return plain_text_response("ERROR: SN is required.", 400)
     
-    logger.info(f"ZKTeco Processor: Handshake received for SN: {sn}")
-    last_sync_id = frappe.db.get_value("Biometric Device", sn, "last_synced_id") or 0
-
-    response_body = f"""GET OPTION FROM: {sn}
-ATTLOGStamp={last_sync_id}
-OPERLOGStamp=9999
-ATTPHOTOStamp=None
-ErrorDelay=30
-Delay=10
-TransTimes=00:00;14:05
-TransInterval=1
-TransFlag=TransData AttLog OpLog AttPhoto EnrollUser ChgUser EnrollFP ChgFP UserPic
-TimeZone=6
-Realtime=1
-Encrypt=None
-"""
+    logger.info("ZKTeco Processor: Handshake received for SN: %s", sn)
+    cached = _LAST_SYNC_CACHE.get(sn)
+    if cached and cached[1] > time.monotonic():
+        response_body = cached[0]
+    else:
+        if cached:
+            _LAST_SYNC_CACHE.pop(sn, None)
+        device = frappe.db.get_value("Biometric Device", sn, ["name", "last_synced_id"])
+        response_body = _handshake_body(sn, (device and device[1]) or 0)
+        if device:
+            _cache_handshake(sn, response_body)
     return plain_text_response(response_body)
 
-def _handle_cdata_post(query_params: dict, raw_body: bytes) -> Response:
+def _handle_cdata_post(sn: str | None, table: str | None, raw_body: bytes) -> Response:
     """Handles data uploads (POST /iclock/cdata)."""
-    sn = query_params.get("SN", [None])[0]
-    table = query_params.get("table", [None])[0]
-    
     if table == "ATTLOG":
         return _process_attlog(sn, raw_body)
     elif table == "OPERLOG":
@@ -75,33 +104,53 @@ def _handle_cdata_post(query_params: dict, raw_body: bytes) -> Response:
     return plain_text_response("OK")
 
 def _process_attlog(sn: str, raw_body: bytes) -> Response:
-    """Parses and processes attendance logs (check-ins)."""
+    """
+    Parses and processes attendance logs (check-ins).
+
+    Lines are parsed up front so malformed rows are dropped before any writes.
+    The check-ins are then inserted without committing, and the batch is
+    committed once together with the device's `last_synced_id`.
+    """
     body_str = raw_body.decode('utf-8', errors='ignore')
-    lines = body_str.strip().split('\n')
-    processed_count = 0
+    rows = []
+    bad_lines = []
     latest_id = 0
 
-    for line in lines:
-        parts = line.strip().split('\t')
+    for line in body_str.splitlines():
+        parts = line.split('\t')
         if len(parts) >= 2:
             try:
-                pin, time_str, _, _, _, _, _, log_id_str = (parts + [None]*8)[:8]
+                pin, time_str = parts[0].strip(), parts[1]
+                log_id_str = parts[7] if len(parts) > 7 else None
+                # fromisoformat also takes dates alone, offsets and compact forms; only accept "YYYY-MM-DD HH:MM:SS".
+                if len(time_str) != 19:
+                    raise ValueError(f"unexpected time format {time_str!r}")
+                rows.append((pin, datetime.fromisoformat(time_str)))
                 log_id = int(log_id_str) if log_id_str and log_id_str.isdigit() else 0
-                
-                create_employee_checkin(
-                    employee_field_value=pin,
-                    timestamp=datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S"),
-                    device_id=sn
-                )
-                processed_count += 1
                 if log_id > latest_id:
                     latest_id = log_id
             except Exception as e:
-                frappe.log_error(f"Failed to process ZKTeco ATTLOG line: '{line}'. Error: {e}", "ZKTeco Processor")
+                bad_lines.append(f"'{line}': {e}")
+
+    # One Error Log per upload, however many lines were malformed.
+    if bad_lines:
+        frappe.log_error(f"Failed to process {len(bad_lines)} ZKTeco ATTLOG line(s):\n" + "\n".join(bad_lines), "ZKTeco Processor")
+
+    # Resolve every distinct PIN in one query; unmatched PINs fall back to the
+    # per-PIN lookup so unknown-employee handling stays the same.
+    employees = get_erp_employee_ids({pin for pin, _ in rows})
+    processed_count = 0
+    for pin, timestamp in rows:
+        if create_employee_checkin(employee_field_value=pin, timestamp=timestamp, device_id=sn, employee_id=employees.get(pin), commit=False):
+            processed_count += 1
 
     if latest_id > 0 and sn:
-        frappe.db.set_value("Biometric Device", sn, "last_synced_id", latest_id, update_modified=False)
+        frappe.db.sql("UPDATE `tabBiometric Device` SET last_synced_id = %s WHERE name = %s", (latest_id, sn))
+    if rows:
         frappe.db.commit()
+    # Refresh only entries the handshake cached, i.e. devices known to exist.
+    if latest_id > 0 and sn in _LAST_SYNC_CACHE:
+        _cache_handshake(sn, _handshake_body(sn, latest_id))
 
     return plain_text_response(f"OK: {processed_count}")
 
@@ -119,51 +168,74 @@ def _process_user_data(sn: str, body_str: str) -> Response:
 
 def _process_fingerprint_data(sn: str, body_str: str) -> Response:
     """Processes fingerprint templates from an OPERLOG."""
-    fp_templates = re.findall(r'FP PIN=(\S+)\s+FID=(\d+)\s+Size=(\d+)\s+Valid=(\d+)\s+TMP=(.*)', body_str)
     processed_count = 0
-    for pin, fid, size, valid, template in fp_templates:
+    for match in _FP_RE.finditer(body_str):
+        pin, template = match.group(1, 5)
         try:
             user_doc = get_or_create_user_by_pin(pin)
             if user_doc:
-                save_enrollment_data(user_doc, "ZKTeco", sn, template.encode('utf-8'))
+                # Templates are base64 text, so ASCII is enough.
+                save_enrollment_data(user_doc, "ZKTeco", sn, template.encode('ascii', 'ignore'))
                 processed_count += 1
         except Exception as e:
             frappe.log_error(f"Failed to process fingerprint data for PIN {pin}. Error: {e}", "ZKTeco Processor")
     return plain_text_response(f"OK: {processed_count}")
 
-def _handle_getrequest(query_params: dict) -> Response:
+def _handle_getrequest(sn: str | None, table: str | None, raw_body: bytes) -> Response:
     """Handles the device's polling for pending commands."""
-    sn = query_params.get("SN", [None])[0]
     if not sn:
         return plain_text_response("ERROR: Missing SN", 400)
         
     command_to_send = process_device_command(sn)
     return plain_text_response(command_to_send or "OK")
 
-def _handle_devicecmd(query_params: dict, raw_body: bytes) -> Response:
-    """Handles the device's reply after executing a command."""
+def _handle_devicecmd(sn: str | None, table: str | None, raw_body: bytes) -> Response:
+    """
+    Handles the device's reply after executing a command.
+
+    A reply body may carry several lines, possibly for the same command. Lines
+    are grouped by command ID so each command is loaded and saved once, and the
+    whole reply is committed together.
+    """
     body_str = raw_body.decode('utf-8', errors='ignore')
+    replies = defaultdict(list)
     
     for line in body_str.strip().split('\n'):
-        params = parse_qs(line)
-        cmd_id = params.get('ID', [None])[0]
-        return_code = params.get('Return', [None])[0]
-        
+        # Reply lines look like "ID=12&Return=0&CMD=DATA"; the fields read here are plain integers.
+        params = dict(pair.split('=', 1) for pair in line.split('&') if '=' in pair)
+        cmd_id = params.get('ID')
         if cmd_id:
-            try:
-                cmd_doc = frappe.get_doc("Biometric Device Command", cmd_id)
-                cmd_doc.device_response = (f"{cmd_doc.device_response or ''}\n{line}").strip()
-                cmd_doc.status = "Success" if return_code == "0" else "Failed"
-                cmd_doc.closed_on = datetime.now()
-                cmd_doc.save(ignore_permissions=True)
-                frappe.db.commit()
-            except Exception as e:
-                 frappe.log_error(f"Failed to update ZKTeco command reply for CmdID {cmd_id}. Error: {e}", "ZKTeco Processor")
+            replies[cmd_id].append((line, params.get('Return')))
+
+    closed_on = datetime.now()
+    for cmd_id, lines in replies.items():
+        try:
+            cmd_doc = frappe.get_doc("Biometric Device Command", cmd_id)
+            response = "\n".join(line for line, _ in lines)
+            cmd_doc.device_response = (f"{cmd_doc.device_response or ''}\n{response}").strip()
+            # As before, the last reported return code decides the status.
+            cmd_doc.status = "Success" if lines[-1][1] == "0" else "Failed"
+            cmd_doc.closed_on = closed_on
+            cmd_doc.save(ignore_permissions=True)
+        except Exception as e:
+            frappe.log_error(f"Failed to update ZKTeco command reply for CmdID {cmd_id}. Error: {e}", "ZKTeco Processor")
+
+    if replies:
+        frappe.db.commit()
 
     return plain_text_response("OK")
 
 # --- Main Entry Point ---
 
+# Dispatch table keyed by (path, method); the paths in _OK_PATHS are acknowledged with any method.
+_ROUTES = {
+    ("/iclock/cdata", "GET"): _handle_cdata_get,
+    ("/iclock/cdata", "POST"): _handle_cdata_post,
+    ("/iclock/getrequest", "GET"): _handle_getrequest,
+    ("/iclock/devicecmd", "POST"): _handle_devicecmd,
+}
+_OK_PATHS = frozenset({"/iclock/ping", "/iclock/registry", "/iclock/edata"})
+
 def handle_zkteco(request: Request, raw_body: bytes, headers: dict, path: str) -> Response:
     """
     The main routing function for all ZKTeco-related requests. It dispatches
@@ -172,24 +244,24 @@ def handle_zkteco(request: Request, raw_body: bytes, headers: dict, path: str) -
     method = request.method
     
     # CORRECTED: Use the exact, case-sensitive header name as seen in the logs.
-    original_uri = headers.get('X-Original-Request-Uri', '/')
-    parsed_uri = urlparse(original_uri)
-    query_params = parse_qs(parsed_uri.query)
-    
-    #logger.info(f"ZKTeco Processor: Parsed URI: {str(parsed_uri)}, Query Params: {dict(query_params)}")
-    #logger.info(f"ZKTeco Processor: Routing request. Method: '{method}', Path: '{path}'")
-    
-    if path == "/iclock/cdata":
-        return _handle_cdata_get(query_params) if method == "GET" else _handle_cdata_post(query_params, raw_body)
-    
-    elif path == "/iclock/getrequest":
-        return _handle_getrequest(query_params)
-        
-    elif path == "/iclock/devicecmd":
-        return _handle_devicecmd(query_params, raw_body)
+    # The query string is parsed once here; handlers receive the fields they use.
+    # NGINX proxies to a fixed backend URL, so the device's query string normally
+    # only survives in X-Original-Request-Uri. Without that header, fall back to
+    # the request's own (already parsed and cached) args.
+    original_uri = headers.get('X-Original-Request-Uri')
+    if original_uri is None:
+        sn = request.args.get("SN")
+        table = request.args.get("table")
+    else:
+        query_params = parse_qs(original_uri.partition('?')[2])
+        sn = query_params.get("SN", [None])[0]
+        table = query_params.get("table", [None])[0]
     
-    elif path in ["/iclock/ping", "/iclock/registry", "/iclock/edata"]:
+    handler = _ROUTES.get((path, method))
+    if handler is not None:
+        return handler(sn, table, raw_body)
+    if path in _OK_PATHS:
         return plain_text_response("OK")
 
-    logger.warning(f"ZKTeco Processor: No route matched for path '{path}' and method '{method}'. Returning 404.")
+    logger.warning("ZKTeco Processor: No route matched for path '%s' and method '%s'. Returning 404.", path, method)
     return plain_text_response("Not Found", 404)
@@ -1,16 +1,31 @@
 import os
-import frappe
 import logging
 import shutil
-from frappe.utils import get_sites
+
+def _get_site_names(sites_path):
+    """Lists site directories under `sites_path`, like frappe.utils.get_sites, in one scandir pass."""
+    with os.scandir(sites_path) as entries:
+        return [
+            entry.name for entry in entries
+            if entry.is_dir(follow_symlinks=False) and os.path.isfile(os.path.join(entry.path, "site_config.json"))
+        ]
 
 def after_uninstall():
     """Cleanup assets directory created by the biometric_integration app only if no site uses it."""
+    # Only this hook needs frappe, so the module itself stays importable without it.
+    import frappe
+
     app_name = "biometric_integration"
     try:
-        # Check all sites to see if the app is still installed elsewhere
+        # Check the other sites to see if the app is still installed elsewhere.
+        # The current site has just removed it, and a single-site bench needs no
+        # connections at all.
         found_app_in_site = False
-        for site in get_sites():
+        current_site = getattr(frappe.local, "site", None)
+        bench_path = frappe.utils.get_bench_path()
+        for site in _get_site_names(os.path.join(bench_path, "sites")):
+            if site == current_site:
+                continue
             try:
                 frappe.init(site=site)
                 frappe.connect()
@@ -22,7 +37,7 @@ def after_uninstall():
                     frappe.destroy()
 
         if not found_app_in_site:
-            assets_dir = os.path.join(frappe.utils.get_bench_path(), "sites", "assets", "biometric_assets")
+            assets_dir = os.path.join(bench_path, "sites", "assets", "biometric_assets")
             if os.path.exists(assets_dir):
                 shutil.rmtree(assets_dir)
                 logging.info("biometric_assets directory removed successfully.")